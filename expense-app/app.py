@@ -1,8 +1,12 @@
 from flask import Flask, render_template, request, jsonify, session
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import text
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
+import json
+import zlib
+import click
 from functools import wraps
 from werkzeug.utils import secure_filename
 from flask_cors import CORS
@@ -12,7 +16,7 @@ from itsdangerous import URLSafeTimedSerializer, SignatureExpired
 app = Flask(__name__)
 # Use absolute path for database to avoid issues on hosting
 basedir = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'database.db')
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///' + os.path.join(basedir, 'database.db'))
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.secret_key = 'supersecretkey' # Change this in production
 
@@ -76,6 +80,7 @@ class Group(db.Model):
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True) # Nullable for migration compatibility
     participants = db.relationship('Participant', backref='group', lazy=True)
     expenses = db.relationship('Expense', backref='group', lazy=True)
+    archive = db.relationship('GroupArchive', backref='group', lazy='joined', uselist=False) # Joined so to_dict() doesn't query per group
 
     def to_dict(self):
         return {
@@ -83,7 +88,8 @@ class Group(db.Model):
             'name': self.name,
             'currency': self.currency,
             'created_at': self.created_at.isoformat(),
-            'created_by': self.created_by
+            'created_by': self.created_by,
+            'archived': self.archive is not None
         }
 
 class Participant(db.Model):
@@ -132,6 +138,169 @@ class ExpenseSplit(db.Model):
             'amount_owed': self.amount_owed
         }
 
+class GroupArchive(db.Model):
+    # Settled groups are compacted into a single row: participants, expenses,
+    # splits and final balances live in a zlib-compressed JSON snapshot and the
+    # detailed rows are removed from the participant/expense/expense_split tables.
+    id = db.Column(db.Integer, primary_key=True)
+    group_id = db.Column(db.Integer, db.ForeignKey('group.id'), unique=True, nullable=False)
+    snapshot = db.deferred(db.Column(db.LargeBinary, nullable=False)) # Only loaded by load()
+    participant_count = db.Column(db.Integer, nullable=False, default=0)
+    forced = db.Column(db.Boolean, default=False) # Archived with outstanding debts
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def load(self):
+        return json.loads(zlib.decompress(self.snapshot).decode('utf-8'))
+
+# --- Balance Helpers ---
+
+def compute_balances(participants, expenses):
+    balances = {p.id: 0.0 for p in participants}
+
+    for expense in expenses:
+        # Payer gets positive balance (they paid, so they are owed)
+        balances[expense.payer_id] += expense.amount
+
+        # People involved get negative balance (they consumed, so they owe)
+        for split in expense.splits:
+            balances[split.participant_id] -= split.amount_owed
+
+    return balances
+
+def simplify_debts(balances):
+    # Separate into debtors (negative balance) and creditors (positive balance)
+    debtors = []
+    creditors = []
+    
+    for pid, balance in balances.items():
+        balance = round(balance, 2)
+        if balance < -0.01:
+            debtors.append({'id': pid, 'amount': balance})
+        elif balance > 0.01:
+            creditors.append({'id': pid, 'amount': balance})
+            
+    # Sort by amount magnitude to optimize (greedy approach)
+    debtors.sort(key=lambda x: x['amount']) # Ascending (most negative first)
+    creditors.sort(key=lambda x: x['amount'], reverse=True) # Descending (most positive first)
+    
+    settlements = []
+    
+    i = 0 # debtor index
+    j = 0 # creditor index
+    
+    while i < len(debtors) and j < len(creditors):
+        debtor = debtors[i]
+        creditor = creditors[j]
+        
+        amount = min(abs(debtor['amount']), creditor['amount'])
+        
+        settlements.append({
+            'from': debtor['id'],
+            'to': creditor['id'],
+            'amount': round(amount, 2)
+        })
+        
+        debtor['amount'] += amount
+        creditor['amount'] -= amount
+        
+        if abs(debtor['amount']) < 0.01:
+            i += 1
+        if creditor['amount'] < 0.01:
+            j += 1
+
+    return settlements
+
+# --- Archive Helpers ---
+
+def lock_group(group_id):
+    """Block other writers to a group until the current transaction ends.
+
+    Must run before the first read of the transaction, so that what gets
+    read (e.g. an archive snapshot) can't go stale before it is written.
+    """
+    if db.engine.dialect.name == 'sqlite':
+        # pysqlite only opens a transaction at the first write; take the
+        # database write lock up front instead
+        db.session.execute(text('BEGIN IMMEDIATE'))
+    else:
+        Group.query.filter_by(id=group_id).with_for_update().first()
+
+def group_last_activity(group):
+    last_expense_at = db.session.query(db.func.max(Expense.created_at)).filter_by(group_id=group.id).scalar()
+    return last_expense_at or group.created_at
+
+def archive_group(group, force=False):
+    """Compact a group into a GroupArchive snapshot.
+
+    Returns the archive, or None if the group still has pending settlements
+    and force is not set. With force, the pending settlements are recorded
+    as the group's final settlement. The caller holds lock_group() and commits.
+    """
+    participants = Participant.query.filter_by(group_id=group.id).all()
+    expenses = Expense.query.filter_by(group_id=group.id).order_by(Expense.created_at.desc()).all()
+
+    balances = compute_balances(participants, expenses)
+    settlements = simplify_debts(balances)
+    if settlements and not force:
+        return None
+
+    snapshot = {
+        'participants': [p.to_dict() for p in participants],
+        'expenses': [e.to_dict() for e in expenses],
+        'balances': balances,
+        'settlements': settlements
+    }
+    archive = GroupArchive(
+        group_id=group.id,
+        snapshot=zlib.compress(json.dumps(snapshot).encode('utf-8')),
+        forced=bool(settlements),
+        participant_count=len(participants)
+    )
+    db.session.add(archive)
+
+    # The group is locked, so these are exactly the rows in the snapshot
+    expense_ids = db.session.query(Expense.id).filter_by(group_id=group.id)
+    ExpenseSplit.query.filter(ExpenseSplit.expense_id.in_(expense_ids)).delete(synchronize_session=False)
+    Expense.query.filter_by(group_id=group.id).delete(synchronize_session=False)
+    Participant.query.filter_by(group_id=group.id).delete(synchronize_session=False)
+    return archive
+
+def unarchive_group(group):
+    """Restore the detailed rows of an archived group and drop its snapshot.
+
+    Rows are re-inserted with fresh ids (the old ones may have been reused),
+    so participant references are remapped. The caller holds lock_group()
+    and commits.
+    """
+    data = group.archive.load()
+
+    participant_ids = {}
+    for p in data['participants']:
+        participant = Participant(group_id=group.id, name=p['name'])
+        db.session.add(participant)
+        db.session.flush()
+        participant_ids[p['id']] = participant.id
+
+    # Snapshot holds expenses newest first; restore them in creation order
+    for e in reversed(data['expenses']):
+        expense = Expense(
+            group_id=group.id,
+            title=e['title'],
+            amount=e['amount'],
+            payer_id=participant_ids[e['payer_id']],
+            created_at=datetime.fromisoformat(e['created_at'])
+        )
+        db.session.add(expense)
+        db.session.flush()
+        for split in e['splits']:
+            db.session.add(ExpenseSplit(
+                expense_id=expense.id,
+                participant_id=participant_ids[split['participant_id']],
+                amount_owed=split['amount_owed']
+            ))
+
+    db.session.delete(group.archive)
+
 # --- Routes ---
 
 # --- Auth Routes ---
@@ -294,12 +463,15 @@ def admin_get_groups():
     for g in groups:
         creator = User.query.get(g.created_by)
         creator_name = creator.name if creator else "Unknown"
+        # Archived groups have no participant rows left
+        participant_count = g.archive.participant_count if g.archive else len(g.participants)
         group_list.append({
             'id': g.id,
             'name': g.name,
             'created_at': g.created_at.isoformat(),
             'created_by_name': creator_name,
-            'participant_count': len(g.participants)
+            'participant_count': participant_count,
+            'archived': g.archive is not None
         })
     return jsonify(group_list), 200
 
@@ -312,6 +484,7 @@ def admin_delete_group(group_id):
     ExpenseSplit.query.filter(ExpenseSplit.expense_id.in_([e.id for e in group.expenses])).delete(synchronize_session=False)
     Expense.query.filter_by(group_id=group.id).delete()
     Participant.query.filter_by(group_id=group.id).delete()
+    GroupArchive.query.filter_by(group_id=group.id).delete()
     
     db.session.delete(group)
     db.session.commit()
@@ -396,6 +569,12 @@ def handle_groups():
 def get_group(group_id):
     group = Group.query.get_or_404(group_id)
     # Optional: Check if user has access to this group
+    if group.archive:
+        return jsonify({
+            'group': group.to_dict(),
+            'participants': group.archive.load()['participants']
+        })
+
     participants = Participant.query.filter_by(group_id=group_id).all()
     return jsonify({
         'group': group.to_dict(),
@@ -406,6 +585,16 @@ def get_group(group_id):
 @login_required
 def handle_expenses(group_id):
     if request.method == 'POST':
+        # Keep the archive check and the insert atomic against archive_group()
+        lock_group(group_id)
+
+    archive = GroupArchive.query.filter_by(group_id=group_id).first()
+
+    if request.method == 'POST':
+        if archive:
+            db.session.rollback() # Release the lock
+            return jsonify({'error': 'Group is archived'}), 409
+
         data = request.json
         # Create Expense
         new_expense = Expense(
@@ -415,12 +604,13 @@ def handle_expenses(group_id):
             payer_id=data['payer_id']
         )
         db.session.add(new_expense)
-        db.session.commit()
+        db.session.flush()
         
         # Create Splits
         # Assuming equal split for now based on 'involved_ids'
         involved_ids = data.get('involved_ids', [])
         if not involved_ids:
+            db.session.rollback()
             return jsonify({'error': 'No participants involved'}), 400
             
         split_amount = data['amount'] / len(involved_ids)
@@ -436,72 +626,108 @@ def handle_expenses(group_id):
         return jsonify(new_expense.to_dict()), 201
         
     else:
+        if archive:
+            return jsonify(archive.load()['expenses'])
+
         expenses = Expense.query.filter_by(group_id=group_id).order_by(Expense.created_at.desc()).all()
         return jsonify([e.to_dict() for e in expenses])
 
 @app.route('/api/groups/<int:group_id>/balance', methods=['GET'])
 @login_required
 def get_balance(group_id):
+    archive = GroupArchive.query.filter_by(group_id=group_id).first()
+    if archive:
+        data = archive.load()
+        return jsonify({
+            'balances': data['balances'],
+            'settlements': data['settlements']
+        })
+
     # 1. Calculate Net Balances
     participants = Participant.query.filter_by(group_id=group_id).all()
-    balances = {p.id: 0.0 for p in participants}
-    
     expenses = Expense.query.filter_by(group_id=group_id).all()
-    
-    for expense in expenses:
-        # Payer gets positive balance (they paid, so they are owed)
-        balances[expense.payer_id] += expense.amount
-        
-        # People involved get negative balance (they consumed, so they owe)
-        for split in expense.splits:
-            balances[split.participant_id] -= split.amount_owed
+    balances = compute_balances(participants, expenses)
             
     # 2. Simplify Debts (Basic Algorithm)
-    # Separate into debtors (negative balance) and creditors (positive balance)
-    debtors = []
-    creditors = []
-    
-    for pid, balance in balances.items():
-        balance = round(balance, 2)
-        if balance < -0.01:
-            debtors.append({'id': pid, 'amount': balance})
-        elif balance > 0.01:
-            creditors.append({'id': pid, 'amount': balance})
-            
-    # Sort by amount magnitude to optimize (greedy approach)
-    debtors.sort(key=lambda x: x['amount']) # Ascending (most negative first)
-    creditors.sort(key=lambda x: x['amount'], reverse=True) # Descending (most positive first)
-    
-    settlements = []
-    
-    i = 0 # debtor index
-    j = 0 # creditor index
-    
-    while i < len(debtors) and j < len(creditors):
-        debtor = debtors[i]
-        creditor = creditors[j]
-        
-        amount = min(abs(debtor['amount']), creditor['amount'])
-        
-        settlements.append({
-            'from': debtor['id'],
-            'to': creditor['id'],
-            'amount': round(amount, 2)
-        })
-        
-        debtor['amount'] += amount
-        creditor['amount'] -= amount
-        
-        if abs(debtor['amount']) < 0.01:
-            i += 1
-        if creditor['amount'] < 0.01:
-            j += 1
+    settlements = simplify_debts(balances)
             
     return jsonify({
         'balances': balances,
         'settlements': settlements
     })
 
+@app.route('/api/groups/<int:group_id>/archive', methods=['POST'])
+@login_required
+def handle_archive(group_id):
+    lock_group(group_id)
+    group = Group.query.get_or_404(group_id)
+    if group.archive:
+        db.session.rollback() # Release the lock
+        return jsonify({'error': 'Group is already archived'}), 409
+
+    data = request.get_json(silent=True)
+    # Only a literal JSON true forces archiving with pending settlements
+    force = isinstance(data, dict) and data.get('force') is True
+    archive = archive_group(group, force=force)
+    if archive is None:
+        db.session.rollback()
+        return jsonify({'error': 'Group has pending settlements'}), 409
+    db.session.commit()
+
+    return jsonify(group.to_dict()), 200
+
+@app.route('/api/groups/<int:group_id>/unarchive', methods=['POST'])
+@login_required
+def handle_unarchive(group_id):
+    lock_group(group_id)
+    group = Group.query.get_or_404(group_id)
+    if not group.archive:
+        db.session.rollback()
+        return jsonify({'error': 'Group is not archived'}), 409
+
+    unarchive_group(group)
+    db.session.commit()
+
+    return jsonify(group.to_dict()), 200
+
+# --- CLI Commands ---
+
+@app.cli.command('archive-idle')
+@click.option('--days', default=90, show_default=True, type=click.IntRange(min=1), help='Archive groups with no expenses in this many days.')
+@click.option('--force', is_flag=True, help='Also archive groups with pending settlements.')
+def archive_idle_command(days, force):
+    """Archive groups that have been idle for DAYS days."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+
+    last_expense = db.session.query(
+        Expense.group_id,
+        db.func.max(Expense.created_at).label('last_at')
+    ).group_by(Expense.group_id).subquery()
+
+    groups = Group.query.outerjoin(
+        last_expense, last_expense.c.group_id == Group.id
+    ).outerjoin(GroupArchive).filter(
+        GroupArchive.id.is_(None),
+        db.func.coalesce(last_expense.c.last_at, Group.created_at) < cutoff
+    ).all()
+
+    archived = 0
+    skipped = 0
+    for group in groups:
+        lock_group(group.id)
+        # Re-check under the lock: the group may have been archived or used since the query above
+        if GroupArchive.query.filter_by(group_id=group.id).count() or group_last_activity(group) >= cutoff:
+            db.session.rollback()
+            continue
+        if archive_group(group, force=force) is None:
+            db.session.rollback()
+            skipped += 1
+            continue
+        db.session.commit()
+        archived += 1
+
+    click.echo(f"Archived {archived} group(s), skipped {skipped} with pending settlements.")
+
 # Initialize DB
 with app.app_context():
     db.create_all()
@@ -0,0 +1,118 @@
+import os
+from datetime import datetime, timedelta
+
+def test_archive():
+    # Must be set before importing app: the engine is bound at import time
+    os.environ['DATABASE_URL'] = 'sqlite:///:memory:' # Use in-memory DB for testing
+    from app import app, db, Participant, Expense, GroupArchive
+
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        db.create_all()
+
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+
+        # 1. Create Group with one expense: Alice pays 100 for Alice & Bob
+        print("1. Creating Group...")
+        resp = client.post('/api/groups', json={
+            'name': 'Archive Trip',
+            'participants': ['Alice', 'Bob']
+        })
+        group_id = resp.get_json()['id']
+
+        resp = client.get(f'/api/groups/{group_id}')
+        p_map = {p['name']: p['id'] for p in resp.get_json()['participants']}
+        alice_id = p_map['Alice']
+        bob_id = p_map['Bob']
+
+        resp = client.post(f'/api/groups/{group_id}/expenses', json={
+            'title': 'Dinner',
+            'amount': 100.0,
+            'payer_id': alice_id,
+            'involved_ids': [alice_id, bob_id]
+        })
+        assert resp.status_code == 201
+
+        before_expenses = client.get(f'/api/groups/{group_id}/expenses').get_json()
+        before_balance = client.get(f'/api/groups/{group_id}/balance').get_json()
+
+        # 2. Archive without force must fail: Bob still owes Alice 50
+        print("\n2. Archiving unsettled group (Should Fail)...")
+        resp = client.post(f'/api/groups/{group_id}/archive', json={})
+        assert resp.status_code == 409
+        resp = client.post(f'/api/groups/{group_id}/archive', json={'force': 'false'})
+        assert resp.status_code == 409
+        resp = client.post(f'/api/groups/{group_id}/archive', json=[1])
+        assert resp.status_code == 409
+        print("   Rejected with 409 as expected.")
+
+        # 3. Forced archive removes detailed rows but keeps the group readable
+        print("\n3. Archiving with forced final settlement...")
+        resp = client.post(f'/api/groups/{group_id}/archive', json={'force': True})
+        assert resp.status_code == 200
+        assert resp.get_json()['archived']
+
+        assert Participant.query.filter_by(group_id=group_id).count() == 0
+        assert Expense.query.filter_by(group_id=group_id).count() == 0
+        assert GroupArchive.query.filter_by(group_id=group_id).one().forced
+
+        resp = client.get(f'/api/groups/{group_id}')
+        assert {p['name'] for p in resp.get_json()['participants']} == {'Alice', 'Bob'}
+        assert client.get(f'/api/groups/{group_id}/expenses').get_json() == before_expenses
+        assert client.get(f'/api/groups/{group_id}/balance').get_json() == before_balance
+
+        resp = client.post(f'/api/groups/{group_id}/expenses', json={
+            'title': 'Taxi',
+            'amount': 10.0,
+            'payer_id': bob_id,
+            'involved_ids': [bob_id]
+        })
+        assert resp.status_code == 409
+        print("   Group readable from snapshot, writes rejected.")
+
+        # 4. Un-archive restores the rows (with new ids)
+        print("\n4. Un-archiving...")
+        resp = client.post(f'/api/groups/{group_id}/unarchive')
+        assert resp.status_code == 200
+        assert not resp.get_json()['archived']
+
+        expenses = client.get(f'/api/groups/{group_id}/expenses').get_json()
+        assert [(e['title'], e['amount']) for e in expenses] == [('Dinner', 100.0)]
+        settlements = client.get(f'/api/groups/{group_id}/balance').get_json()['settlements']
+        assert len(settlements) == 1 and settlements[0]['amount'] == 50.0
+        print("   Expenses and balances restored.")
+
+        # 5. CLI archives settled idle groups only
+        print("\n5. Running archive-idle CLI...")
+        resp = client.post(f'/api/groups/{group_id}/expenses', json={
+            'title': 'Payback',
+            'amount': 50.0,
+            'payer_id': bob_id,
+            'involved_ids': [alice_id]
+        })
+        assert resp.status_code == 201
+        old = datetime.utcnow() - timedelta(days=100)
+        Expense.query.filter_by(group_id=group_id).update({'created_at': old})
+        db.session.commit()
+
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=['archive-idle', '--days', '0', '--force'])
+        assert result.exit_code != 0
+        assert GroupArchive.query.filter_by(group_id=group_id).count() == 0
+
+        result = runner.invoke(args=['archive-idle', '--days', '30'])
+        print("   " + result.output.strip())
+        assert result.exit_code == 0
+        assert GroupArchive.query.filter_by(group_id=group_id).count() == 1
+        assert not GroupArchive.query.filter_by(group_id=group_id).one().forced
+        assert Expense.query.filter_by(group_id=group_id).count() == 0
+
+        resp = client.post(f'/api/groups/{group_id}/archive', json={})
+        assert resp.status_code == 409
+        print("\nSUCCESS: Archive logic verified!")
+
+if __name__ == '__main__':
+    test_archive()